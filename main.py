@@ -1,19 +1,27 @@
+import asyncio
+import functools
+import inspect
+import logging
 import os
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Query
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+import xxhash
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from database import db, create_document, get_documents
+from fastapi.responses import ORJSONResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel, EmailStr, TypeAdapter, ValidationError
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+from database import db, database_url
 
-app = FastAPI(title="SignifyLearn API", version="1.0.0")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
 
 # --------- Models (request/response) ---------
 class GestureOut(BaseModel):
@@ -23,12 +31,19 @@ class GestureOut(BaseModel):
     difficulty: str
     thumbnail: Optional[str] = None
 
+class GesturePage(BaseModel):
+    items: List[GestureOut] = []
+    next_cursor: Optional[str] = None
+
 class GestureDetail(GestureOut):
     video_url: Optional[str] = None
     steps: List[str] = []
     examples: List[str] = []
     tags: List[str] = []
 
+class GestureFull(GestureDetail):
+    is_favorite: bool = False
+
 class ModuleOut(BaseModel):
     title: str
     slug: str
@@ -46,6 +61,9 @@ class QuizQuestion(BaseModel):
     options: List[str]
     answer_index: int
 
+class ModuleFull(ModuleDetail):
+    quizzes: List[QuizQuestion] = []
+
 class FavoriteIn(BaseModel):
     user_email: EmailStr
     gesture_slug: str
@@ -64,12 +82,142 @@ class ProgressIn(BaseModel):
     module_slug: str
     completed_lessons: List[int] = []
 
+# --------- Indexes ---------
+# Created by ensure_indexes() and passed as hint() (via index_hint) by the queries that depend on
+# them, so the planner never falls back to a COLLSCAN; changing one of these changes both sides.
+FAVORITE_INDEX = [("user_email", 1), ("gesture_slug", 1)]
+PROGRESS_INDEX = [("user_email", 1), ("module_slug", 1)]
+USER_EMAIL_INDEX = [("email", 1)]
+
+COLLECTION_INDEXES = {
+    "gesture": [
+        IndexModel([("slug", 1)], unique=True),
+        IndexModel([("name_lc", 1)]),
+        IndexModel([("category", 1), ("_id", 1)]),
+    ],
+    "module": [IndexModel([("slug", 1)], unique=True)],
+    "quizquestion": [IndexModel([("module_slug", 1)])],
+    "favorite": [IndexModel(FAVORITE_INDEX, unique=True)],
+    "user": [IndexModel(USER_EMAIL_INDEX, unique=True)],
+    "progress": [IndexModel(PROGRESS_INDEX, unique=True)],
+}
+
+# --------- Projections ---------
+# Built once at import and shared by reference across requests
+GESTURE_LIST_PROJECTION = {"_id": 1, "name": 1, "slug": 1, "category": 1, "difficulty": 1, "thumbnail": 1}
+MODULE_LIST_PROJECTION = {"_id": 0, "title": 1, "slug": 1, "summary": 1, "cover": 1, "difficulty": 1}
+QUIZ_PROJECTION = {"_id": 0, "module_slug": 1, "prompt": 1, "media": 1, "options": 1, "answer_index": 1}
+GESTURE_DETAIL_PROJECTION = {
+    "_id": 0, "name": 1, "slug": 1, "category": 1, "difficulty": 1, "thumbnail": 1,
+    "video_url": 1, "steps": 1, "examples": 1, "tags": 1,
+}
+MODULE_FULL_PROJECTION = {
+    "_id": 0, "title": 1, "slug": 1, "summary": 1, "cover": 1, "lessons": 1, "difficulty": 1,
+    **{f"quizzes.{k}": 1 for k in QUIZ_PROJECTION if k != "_id"},
+}
+# Only fields of the (user_email, gesture_slug) index, so favorite lookups are answered from the index alone
+FAVORITE_PROJECTION = {"_id": 0, "user_email": 1, "gesture_slug": 1}
+USER_PROFILE_PROJECTION = {
+    "_id": 0, "name": 1, "email": 1, "avatar": 1, "points": 1, "level": 1, "streak": 1, "badges": 1,
+}
+PROGRESS_PROJECTION = {"_id": 0, "completed_lessons": 1}
+
 # --------- Utilities ---------
 
-def ensure_seed_data():
-    if db is None:
+# Gestures and modules are read-only catalog data, so a short TTL is the only invalidation needed.
+# Entries hold the already-serialized response body, so hits skip Mongo and orjson entirely.
+CATALOG_CACHE_MAXSIZE = 1024
+CATALOG_CACHE_TTL_SECONDS = 60
+_catalog_cache: "OrderedDict[int, Tuple[bytes, float]]" = OrderedDict()
+
+def cached_catalog(func):
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, request: Request, **kwargs):
+        key = xxhash.xxh3_64_intdigest(
+            repr((request.url.path, tuple(sorted(request.query_params.multi_items())))).encode()
+        )
+        now = time.monotonic()
+        hit = _catalog_cache.get(key)
+        if hit is not None and hit[1] > now:
+            _catalog_cache.move_to_end(key)
+            return Response(content=hit[0], media_type="application/json")
+        result = await func(*args, **kwargs)
+        # Only rendered bodies are stored; fallbacks such as a missing database go through uncached
+        if isinstance(result, Response):
+            _catalog_cache[key] = (result.body, now + CATALOG_CACHE_TTL_SECONDS)
+            _catalog_cache.move_to_end(key)
+            while len(_catalog_cache) > CATALOG_CACHE_MAXSIZE:
+                _catalog_cache.popitem(last=False)
+        return result
+
+    # Expose the handler's own params plus the Request so FastAPI injects it
+    wrapper.__signature__ = sig.replace(parameters=[
+        *sig.parameters.values(),
+        inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+    ])
+    return wrapper
+
+_EMAIL_ADAPTER = TypeAdapter(EmailStr)
+# Email query params are declared as str and checked by query_email(); keep the published schema unchanged
+EMAIL_QUERY_SCHEMA = {"format": "email"}
+
+@functools.lru_cache(maxsize=4096)
+def _validate_email(raw: str) -> str:
+    return _EMAIL_ADAPTER.validate_python(raw)
+
+def query_email(raw: str, field: str) -> str:
+    """Validate an email query param once per distinct value, with FastAPI's 422 error shape"""
+    try:
+        return _validate_email(raw)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("query", field)} for err in e.errors(include_url=False)]
+        )
+
+def search_key(name: str) -> str:
+    """Lowercased gesture name stored as name_lc; the only lowercasing rule for search.
+
+    Catalog writers outside this API that rename a gesture must update name_lc with this rule
+    (Python str.lower()); otherwise the stale key is only corrected at the next startup.
+    """
+    return name.lower()
+
+_seed_checked = False
+
+async def ensure_seed_data():
+    global _seed_checked
+    if db is None or _seed_checked:
         return
-    if "gesture" not in db.list_collection_names() or db["gesture"].count_documents({}) == 0:
+    # Only the worker whose upsert creates the marker seeds; the others skip straight to serving
+    marker = await db["_meta"].update_one(
+        {"_id": "seeded"},
+        {"$setOnInsert": {"at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    if marker.upserted_id is not None:
+        try:
+            await _seed_collections()
+        except Exception:
+            # Release the claim so the next startup retries instead of serving a half-seeded catalog
+            await db["_meta"].delete_one({"_id": "seeded"})
+            raise
+    _seed_checked = True
+
+async def _seed_collections():
+    names = set(await db.list_collection_names())
+
+    async def is_empty(name: str) -> bool:
+        # estimated_document_count reads collection metadata instead of scanning
+        return name not in names or await db[name].estimated_document_count() == 0
+
+    # One concurrent round of emptiness probes, then one concurrent round of writes
+    gesture_empty, module_empty, quiz_empty = await asyncio.gather(
+        is_empty("gesture"), is_empty("module"), is_empty("quizquestion"),
+    )
+    writes = []
+    if gesture_empty:
         gestures = [
             {
                 "name": "A",
@@ -105,8 +253,10 @@ def ensure_seed_data():
                 "tags": ["basic", "courtesy"],
             },
         ]
-        db["gesture"].insert_many(gestures)
-    if "module" not in db.list_collection_names() or db["module"].count_documents({}) == 0:
+        for g in gestures:
+            g["name_lc"] = search_key(g["name"])
+        writes.append(db["gesture"].insert_many(gestures, ordered=False))
+    if module_empty:
         modules = [
             {
                 "title": "Dasar-Dasar Bahasa Isyarat",
@@ -125,8 +275,8 @@ def ensure_seed_data():
                 "difficulty": "Menengah",
             },
         ]
-        db["module"].insert_many(modules)
-    if "quizquestion" not in db.list_collection_names() or db["quizquestion"].count_documents({}) == 0:
+        writes.append(db["module"].insert_many(modules, ordered=False))
+    if quiz_empty:
         quizzes = [
             {
                 "module_slug": "dasar-dasar",
@@ -136,17 +286,81 @@ def ensure_seed_data():
                 "answer_index": 0,
             }
         ]
-        db["quizquestion"].insert_many(quizzes)
+        writes.append(db["quizquestion"].insert_many(quizzes, ordered=False))
+    await asyncio.gather(*writes)
+
+async def ensure_indexes():
+    if db is None:
+        return
+    await asyncio.gather(_backfill_search_keys(), *(
+        _create_collection_indexes(name, models) for name, models in COLLECTION_INDEXES.items()
+    ))
+
+async def _backfill_search_keys():
+    """Recompute missing or stale name_lc values with the same rule the query side uses"""
+    docs = await db["gesture"].find({}, {"_id": 1, "name": 1, "name_lc": 1}).to_list(length=None)
+    ops = [
+        UpdateOne({"_id": d["_id"]}, {"$set": {"name_lc": search_key(d.get("name") or "")}})
+        for d in docs
+        if d.get("name_lc") != search_key(d.get("name") or "")
+    ]
+    if ops:
+        await db["gesture"].bulk_write(ops, ordered=False)
+
+# Collections whose COLLECTION_INDEXES build succeeded; a hint is only valid for these
+_indexed_collections = set()
+
+async def _create_collection_indexes(name: str, models: List[IndexModel]):
+    try:
+        await db[name].create_indexes(models)
+    except OperationFailure as e:
+        # Older deployments may hold duplicate rows from before the unique indexes existed.
+        # The collection stays out of _indexed_collections, so its queries run unhinted
+        # (and unindexed) instead of failing, until the rows are removed and the app restarts.
+        logger.error("Could not create indexes on %r (remove duplicate rows and restart): %s", name, e)
+        return
+    _indexed_collections.add(name)
+
+def index_hint(collection: str, index):
+    """Hint for a query on collection, or None if its indexes could not be built at startup"""
+    return index if collection in _indexed_collections else None
 
-ensure_seed_data()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_seed_data()
+    await ensure_indexes()
+    yield
+
+app = FastAPI(
+    title="SignifyLearn API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # --------- Health/Test ---------
 @app.api_route("/", methods=["GET", "HEAD"])
-def read_root():
+async def read_root():
     return {"message": "SignifyLearn API running"}
 
+# Probes are answered from this snapshot for a few seconds so load balancers don't hit Mongo each time
+HEALTH_TTL_SECONDS = 5
+_HEALTH = {"t": 0.0, "v": None}
+DATABASE_URL_STATUS = "✅ Set" if database_url else "❌ Not Set"
+
 @app.api_route("/test", methods=["GET", "HEAD"])
-def test_database():
+async def test_database():
+    now = time.monotonic()
+    if _HEALTH["v"] is not None and now - _HEALTH["t"] < HEALTH_TTL_SECONDS:
+        return _HEALTH["v"]
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -158,11 +372,11 @@ def test_database():
     try:
         if db is not None:
             response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
+            response["database_url"] = DATABASE_URL_STATUS
             response["database_name"] = db.name
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -171,20 +385,43 @@ def test_database():
             response["database"] = "⚠️ Available but not initialized"
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:80]}"
+    _HEALTH["t"] = now
+    _HEALTH["v"] = response
     return response
 
 # --------- Gestures ---------
-@app.get("/api/gestures", response_model=List[GestureOut])
-def list_gestures(q: Optional[str] = Query(None), category: Optional[str] = None, page: int = 1, page_size: int = 20):
+# Read endpoints return ORJSONResponse directly so FastAPI skips re-validating the projected
+# Mongo documents; response_model stays on the route for the OpenAPI schema. FastAPI compiles
+# that validator once at route registration, so per-handler TypeAdapters would add no savings.
+@app.get("/api/gestures", response_model=GesturePage)
+@cached_catalog
+async def list_gestures(q: Optional[str] = Query(None), category: Optional[str] = None, after: Optional[str] = None, page_size: int = Query(20, ge=1, le=100)):
     if db is None:
-        return []
+        return {"items": [], "next_cursor": None}
     filters = {}
     if q:
-        filters["name"] = {"$regex": q, "$options": "i"}
+        # Left-anchored match on the lowercased key so Mongo can use the name_lc index; gestures
+        # inserted outside the API since the last boot have no key yet and fall back to name
+        filters["$or"] = [
+            {"name_lc": {"$regex": f"^{re.escape(search_key(q))}"}},
+            {"name_lc": {"$exists": False}, "name": {"$regex": f"^{re.escape(q)}", "$options": "i"}},
+        ]
     if category:
         filters["category"] = category
-    cursor = db["gesture"].find(filters).skip((page - 1) * page_size).limit(page_size)
-    return [
+    if after:
+        # Range scan on _id instead of skip() so deep pages cost the same as the first
+        try:
+            filters["_id"] = {"$gt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    cursor = db["gesture"].find(
+        filters,
+        GESTURE_LIST_PROJECTION,
+        # page_size is bounded to >= 1 by the Query above; the driver rejects negative batch sizes
+        batch_size=page_size,
+    ).sort("_id", 1).limit(page_size)
+    docs = await cursor.to_list(length=page_size)
+    items = [
         {
             "name": g.get("name"),
             "slug": g.get("slug"),
@@ -192,17 +429,20 @@ def list_gestures(q: Optional[str] = Query(None), category: Optional[str] = None
             "difficulty": g.get("difficulty", "Pemula"),
             "thumbnail": g.get("thumbnail"),
         }
-        for g in cursor
+        for g in docs
     ]
+    next_cursor = str(docs[-1]["_id"]) if docs and len(docs) == page_size else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @app.get("/api/gestures/{slug}", response_model=GestureDetail)
-def get_gesture(slug: str):
+@cached_catalog
+async def get_gesture(slug: str):
     if db is None:
         raise HTTPException(status_code=404, detail="Not found")
-    doc = db["gesture"].find_one({"slug": slug})
+    doc = await db["gesture"].find_one({"slug": slug})
     if not doc:
         raise HTTPException(status_code=404, detail="Gesture not found")
-    return {
+    return ORJSONResponse({
         "name": doc.get("name"),
         "slug": doc.get("slug"),
         "category": doc.get("category"),
@@ -212,15 +452,54 @@ def get_gesture(slug: str):
         "steps": doc.get("steps", []),
         "examples": doc.get("examples", []),
         "tags": doc.get("tags", []),
-    }
+    })
+
+@app.get("/api/gestures/{slug}/full", response_model=GestureFull)
+async def get_gesture_full(slug: str, user_email: Optional[str] = Query(None, json_schema_extra=EMAIL_QUERY_SCHEMA)):
+    email = query_email(user_email, "user_email") if user_email is not None else None
+    if db is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    pipeline = [{"$match": {"slug": slug}}, {"$limit": 1}, {"$project": GESTURE_DETAIL_PROJECTION}]
+    if email:
+        # Join the caller's favorite in the same round-trip instead of a second query
+        pipeline.append({
+            "$lookup": {
+                "from": "favorite",
+                # Uncorrelated: both keys are known up front, so the match uses the favorite index
+                "pipeline": [
+                    {"$match": {"user_email": email, "gesture_slug": slug}},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": "fav",
+            }
+        })
+    docs = await db["gesture"].aggregate(pipeline).to_list(length=1)
+    if not docs:
+        raise HTTPException(status_code=404, detail="Gesture not found")
+    doc = docs[0]
+    return ORJSONResponse({
+        "name": doc.get("name"),
+        "slug": doc.get("slug"),
+        "category": doc.get("category"),
+        "difficulty": doc.get("difficulty", "Pemula"),
+        "thumbnail": doc.get("thumbnail"),
+        "video_url": doc.get("video_url"),
+        "steps": doc.get("steps", []),
+        "examples": doc.get("examples", []),
+        "tags": doc.get("tags", []),
+        "is_favorite": bool(doc.get("fav")),
+    })
 
 # --------- Modules ---------
 @app.get("/api/modules", response_model=List[ModuleOut])
-def list_modules():
+@cached_catalog
+async def list_modules():
     if db is None:
         return []
-    cursor = db["module"].find({})
-    return [
+    cursor = db["module"].find({}, MODULE_LIST_PROJECTION)
+    docs = await cursor.to_list(length=None)
+    return ORJSONResponse([
         {
             "title": m.get("title"),
             "slug": m.get("slug"),
@@ -228,32 +507,67 @@ def list_modules():
             "cover": m.get("cover"),
             "difficulty": m.get("difficulty", "Pemula"),
         }
-        for m in cursor
-    ]
+        for m in docs
+    ])
 
 @app.get("/api/modules/{slug}", response_model=ModuleDetail)
-def get_module(slug: str):
+@cached_catalog
+async def get_module(slug: str):
     if db is None:
         raise HTTPException(status_code=404, detail="Not found")
-    m = db["module"].find_one({"slug": slug})
+    m = await db["module"].find_one({"slug": slug})
     if not m:
         raise HTTPException(status_code=404, detail="Module not found")
-    return {
+    return ORJSONResponse({
         "title": m.get("title"),
         "slug": m.get("slug"),
         "summary": m.get("summary"),
         "cover": m.get("cover"),
         "lessons": m.get("lessons", []),
         "difficulty": m.get("difficulty", "Pemula"),
-    }
+    })
+
+@app.get("/api/modules/{slug}/full", response_model=ModuleFull)
+@cached_catalog
+async def get_module_full(slug: str):
+    if db is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    docs = await db["module"].aggregate([
+        {"$match": {"slug": slug}},
+        {"$limit": 1},
+        {"$lookup": {"from": "quizquestion", "localField": "slug", "foreignField": "module_slug", "as": "quizzes"}},
+        {"$project": MODULE_FULL_PROJECTION},
+    ]).to_list(length=1)
+    if not docs:
+        raise HTTPException(status_code=404, detail="Module not found")
+    m = docs[0]
+    return ORJSONResponse({
+        "title": m.get("title"),
+        "slug": m.get("slug"),
+        "summary": m.get("summary"),
+        "cover": m.get("cover"),
+        "lessons": m.get("lessons", []),
+        "difficulty": m.get("difficulty", "Pemula"),
+        "quizzes": [
+            {
+                "module_slug": q.get("module_slug"),
+                "prompt": q.get("prompt"),
+                "media": q.get("media"),
+                "options": q.get("options", []),
+                "answer_index": q.get("answer_index", 0),
+            }
+            for q in m.get("quizzes", [])
+        ],
+    })
 
 # --------- Quizzes ---------
 @app.get("/api/quizzes/{module_slug}", response_model=List[QuizQuestion])
-def get_quiz(module_slug: str):
+async def get_quiz(module_slug: str):
     if db is None:
         return []
-    cursor = db["quizquestion"].find({"module_slug": module_slug})
-    return [
+    cursor = db["quizquestion"].find({"module_slug": module_slug}, QUIZ_PROJECTION)
+    docs = await cursor.to_list(length=None)
+    return ORJSONResponse([
         {
             "module_slug": q.get("module_slug"),
             "prompt": q.get("prompt"),
@@ -261,39 +575,65 @@ def get_quiz(module_slug: str):
             "options": q.get("options", []),
             "answer_index": q.get("answer_index", 0),
         }
-        for q in cursor
-    ]
+        for q in docs
+    ])
 
 # --------- Favorites ---------
 @app.get("/api/favorites")
-def list_favorites(user_email: EmailStr):
+async def list_favorites(user_email: str = Query(..., json_schema_extra=EMAIL_QUERY_SCHEMA)):
+    email = query_email(user_email, "user_email")
     if db is None:
         return []
-    favs = db["favorite"].find({"user_email": user_email})
-    return [{"user_email": f.get("user_email"), "gesture_slug": f.get("gesture_slug") } for f in favs]
+    # The projection already yields the response shape, so the documents go out as-is
+    favs = await db["favorite"].find({"user_email": email}, FAVORITE_PROJECTION, hint=index_hint("favorite", FAVORITE_INDEX)).to_list(length=None)
+    return ORJSONResponse(favs)
+
+def favorite_upsert(payload: FavoriteIn):
+    """Filter/update pair that inserts a favorite once; the unique index makes repeats no-ops"""
+    now = datetime.now(timezone.utc)
+    doc = {**payload.model_dump(), "created_at": now, "updated_at": now}
+    return (
+        {"user_email": payload.user_email, "gesture_slug": payload.gesture_slug},
+        {"$setOnInsert": doc},
+    )
 
 @app.post("/api/favorites")
-def add_favorite(payload: FavoriteIn):
+async def add_favorite(payload: FavoriteIn):
     if db is None:
         return {"ok": False}
-    existing = db["favorite"].find_one({"user_email": payload.user_email, "gesture_slug": payload.gesture_slug})
-    if existing:
-        return {"ok": True}
-    create_document("favorite", payload.model_dump())
+    await db["favorite"].update_one(*favorite_upsert(payload), upsert=True, hint=index_hint("favorite", FAVORITE_INDEX))
+    return {"ok": True}
+
+@app.post("/api/favorites/bulk")
+async def add_favorites_bulk(payload: List[FavoriteIn]):
+    if db is None:
+        return {"ok": False}
+    if payload:
+        hint = index_hint("favorite", FAVORITE_INDEX)
+        await db["favorite"].bulk_write(
+            [UpdateOne(*favorite_upsert(p), upsert=True, hint=hint) for p in payload],
+            ordered=False,
+        )
     return {"ok": True}
 
 # --------- Profile ---------
 @app.get("/api/profile", response_model=UserProfile)
-def get_profile(email: EmailStr):
+async def get_profile(email: str = Query(..., json_schema_extra=EMAIL_QUERY_SCHEMA)):
+    email = query_email(email, "email")
     if db is None:
         raise HTTPException(status_code=404, detail="Not found")
-    u = db["user"].find_one({"email": str(email)})
-    if not u:
-        # create a minimal profile on the fly
-        profile = {"name": "Pengguna", "email": str(email), "points": 120, "level": 2, "streak": 5, "badges": ["Pemula"]}
-        create_document("user", profile)
-        u = db["user"].find_one({"email": str(email)})
-    return {
+    # create a minimal profile on the fly; the email itself comes from the upsert filter
+    now = datetime.now(timezone.utc)
+    profile = {"name": "Pengguna", "points": 120, "level": 2, "streak": 5, "badges": ["Pemula"], "created_at": now, "updated_at": now}
+    u = await db["user"].find_one_and_update(
+        {"email": email},
+        {"$setOnInsert": profile},
+        projection=USER_PROFILE_PROJECTION,
+        upsert=True,
+        hint=index_hint("user", USER_EMAIL_INDEX),
+        return_document=ReturnDocument.AFTER,
+    )
+    return ORJSONResponse({
         "name": u.get("name", "Pengguna"),
         "email": u.get("email"),
         "avatar": u.get("avatar"),
@@ -301,24 +641,30 @@ def get_profile(email: EmailStr):
         "level": u.get("level", 1),
         "streak": u.get("streak", 0),
         "badges": u.get("badges", []),
-    }
+    })
 
 # --------- Progress ---------
 @app.get("/api/progress")
-def get_progress(user_email: EmailStr, module_slug: str):
+async def get_progress(user_email: str = Query(..., json_schema_extra=EMAIL_QUERY_SCHEMA), module_slug: str = Query(...)):
+    email = query_email(user_email, "user_email")
     if db is None:
         return {"completed_lessons": []}
-    p = db["progress"].find_one({"user_email": str(user_email), "module_slug": module_slug})
-    return {"completed_lessons": p.get("completed_lessons", [])} if p else {"completed_lessons": []}
+    p = await db["progress"].find_one(
+        {"user_email": email, "module_slug": module_slug},
+        PROGRESS_PROJECTION,
+        hint=index_hint("progress", PROGRESS_INDEX),
+    )
+    return ORJSONResponse({"completed_lessons": p.get("completed_lessons", []) if p else []})
 
 @app.post("/api/progress")
-def set_progress(payload: ProgressIn):
+async def set_progress(payload: ProgressIn):
     if db is None:
         return {"ok": False}
-    db["progress"].update_one(
+    await db["progress"].update_one(
         {"user_email": payload.user_email, "module_slug": payload.module_slug},
         {"$set": {"completed_lessons": payload.completed_lessons}},
         upsert=True,
+        hint=index_hint("progress", PROGRESS_INDEX),
     )
     return {"ok": True}
 